@@ -2,28 +2,34 @@
 # author: Justin Salsbery
 
 from argparse import ArgumentParser, HelpFormatter, Namespace
-from io import TextIOWrapper
-from sys import argv, stdout, stderr
-from enum import Enum, auto
-from dataclasses import dataclass
-from subprocess import getstatusoutput
-from tempfile import NamedTemporaryFile
+from io import BufferedReader
+from sys import argv, stdout, stderr, intern
+from enum import IntEnum, auto
+from typing import Iterable, Iterator, Optional
+from hashlib import blake2b
+import os
+import re
+import time
 
 
 EXIT_FAILURE = 1
 VERSION = "1.0.0"
 
+# An empty or relative XDG_CACHE_HOME is ignored, as the XDG spec requires.
+CACHE_HOME = os.environ.get("XDG_CACHE_HOME", "")
+if not os.path.isabs(CACHE_HOME):
+    CACHE_HOME = os.path.expanduser("~/.cache")
+CACHE_DIR = os.path.join(CACHE_HOME, "go_call_graph")
+CACHE_ENTRY = re.compile(r"[0-9a-f]{128}(\.[0-9]+)?")  # A key, or a temp file of one.
+CACHE_MAX_AGE = 30 * 24 * 60 * 60  # Seconds since an entry was last used.
+
+GV_SYNTAX = re.compile(r"[#{}=]")  # Only found in the header and the ending.
+WORD = re.compile(r"\w+")
+
 
 def main() -> None:
     args = parse_args()
 
-    filters = ""
-    if args.filter:  # Optional filter
-        filters += " | { grep -w"
-        for filter in args.filter:
-            filters += f" -e {filter}"
-        filters += " || true; }"
-
     print("# dot -Ksfdp -Tpng input.gv -o output.png", file=stdout)
     print("digraph call_graph {", file=stdout)
     print("\tgraph [splines=true overlap=false];", file=stdout)
@@ -35,41 +41,157 @@ def main() -> None:
                   file=stderr)
             exit(EXIT_FAILURE)
 
-        # Remove the header and the ending from the file.
-        filters += " | { grep -Ev '[#{}=]'  || true; }"
-        print(filter_calls(args.source, filters), file=stdout)
+        try:
+            with open(args.source, "r") as file:
+                # Remove the header and the ending from the file. The last line
+                # may lack a newline, which would join it to the ending.
+                lines = (line.rstrip("\n") + "\n" for line in file if not GV_SYNTAX.search(line))
+                stdout.writelines(filter_calls(lines, args.filter))  # Streamed, line by line.
+        except Exception as e:
+            print(f"Error: cannot open {args.source}", file=stderr)
     else:
-        # We store the output in a temporary file such that the filtering
-        # logic can be shared between source and paths.
+        # The output is kept in memory such that the filtering logic can be
+        # shared between source and paths.
+
+        lines = []
+        parser = Parser(lines)
+
+        for path in args.paths:
+            if not path.endswith(".go"):
+                print(f"Error: incorrect file extension on {path}",
+                      file=stderr)
+                continue
+
+            try:
+                parser.add(parse_file(parser, path, args.cache))
+            except Exception as e:
+                print(f"Error: cannot open {path}", file=stderr)
 
-        temp = NamedTemporaryFile().name
-        with open(temp, "w") as output:
-            parser = Parser(output)
+        if args.cache:
+            prune_cache()
 
-            for path in args.paths:
-                if not path.endswith(".go"):
-                    print(f"Error: incorrect file extension on {path}",
-                          file=stderr)
+        stdout.write("".join(filter_calls(lines, args.filter)))
+
+    print("}", file=stdout)
+
+
+# Returns the call graph lines of a Go file. The lines are cached on disk by
+# path, modification time, and size, such that unchanged files are not parsed
+# again on the next run. They are also cached by the hash of the contents, such
+# that files which were touched, copied, or checked out again are not parsed
+# either. Both keys include the hash of the tool, such that any change to the
+# tokenizer or parser invalidates the cache.
+def parse_file(parser: "Parser", path: str, cache: bool) -> list[str]:
+    if not cache:
+        with open(path, "rb") as file:
+            return parser.parse(Tokenizer(file))
+
+    stat = os.stat(path)
+    key = f"{TOOL_HASH}:{os.path.realpath(path)}:{stat.st_mtime_ns}:{stat.st_size}"
+    stat_path = os.path.join(CACHE_DIR, blake2b(key.encode()).hexdigest())
+
+    lines = read_cache(stat_path)
+    if lines is not None:
+        return lines
+
+    with open(path, "rb") as file:
+        src = file.read()  # Read once, for both the hash and the tokenizer.
+        digest = blake2b(TOOL_HASH.encode())
+        digest.update(src)
+        content_path = os.path.join(CACHE_DIR, digest.hexdigest())
+
+        lines = read_cache(content_path)
+        if lines is None:
+            lines = parser.parse(Tokenizer(file, src))
+            write_cache(content_path, lines)
+
+    link_cache(content_path, stat_path, lines)
+    return lines
+
+
+# Returns the cached lines, or None if they are not cached yet. The entry is
+# marked as used, such that it is not pruned.
+def read_cache(cache_path: str) -> Optional[list[str]]:
+    try:
+        with open(cache_path, "r", encoding="utf-8") as file:
+            lines = file.readlines()
+    except (OSError, ValueError):  # ValueError includes decoding errors.
+        return None
+
+    try:
+        os.utime(cache_path)
+    except OSError:
+        pass  # A read-only cache is still read.
+
+    return lines
+
+
+def write_cache(cache_path: str, lines: list[str]) -> None:
+    temp = f"{cache_path}.{os.getpid()}"
+    try:  # The cache is optional, the lines are returned either way.
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(temp, "w", encoding="utf-8") as file:
+            file.writelines(lines)
+        os.replace(temp, cache_path)
+    except (OSError, ValueError):  # ValueError includes encoding errors.
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+
+
+# Adds a second key for the entry of the first key. A hard link is used rather
+# than a copy, and the lines are written out only if linking fails.
+def link_cache(entry_path: str, cache_path: str, lines: list[str]) -> None:
+    temp = f"{cache_path}.{os.getpid()}"
+    try:
+        os.link(entry_path, temp)
+        os.replace(temp, cache_path)
+    except OSError:
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+        write_cache(cache_path, lines)
+
+
+# Removes the cache entries that have not been used for CACHE_MAX_AGE, which
+# includes the entries of older versions of the tool. Only files named like a
+# cache entry are removed, anything else in the directory is left alone.
+def prune_cache() -> None:
+    expired = time.time() - CACHE_MAX_AGE
+    try:
+        with os.scandir(CACHE_DIR) as entries:
+            for entry in entries:
+                if not CACHE_ENTRY.fullmatch(entry.name):
                     continue
 
                 try:
-                    with open(path, "r") as file:
-                        tokenizer = Tokenizer(file)
-                        parser.parse(tokenizer)
-                except Exception as e:
-                    print(f"Error: cannot open {path}", file=stderr)
+                    if entry.is_file(follow_symlinks=False) \
+                            and entry.stat(follow_symlinks=False).st_mtime < expired:
+                        os.remove(entry.path)
+                except OSError:
+                    pass
+    except OSError:
+        pass  # Pruning is optional, like the cache.
 
-        print(filter_calls(temp, filters), file=stdout)
 
-    print("}", file=stdout)
+# Returns the hash of this file, which is part of every cache key.
+def hash_tool() -> str:
+    with open(__file__, "rb") as file:
+        return blake2b(file.read()).hexdigest()
+
 
+TOOL_HASH = hash_tool()
 
-def filter_calls(path: str, filters: str) -> str:
-    status, output = getstatusoutput(f"cat {path} 2>/dev/null {filters}")
 
-    if status != 0:
-        print(f"Error: cannot open {path}", file=stderr)
-    return output
+# Keeps the lines that contain one of the filters as a whole word.
+def filter_calls(lines: Iterable[str], filters: Optional[list[str]]) -> Iterable[str]:
+    if not filters:  # Optional filter
+        return lines
+
+    filters = set(filters)
+    return (line for line in lines if not filters.isdisjoint(WORD.findall(line)))
 
 
 # *****************************************************************************
@@ -112,6 +234,8 @@ def parse_args() -> Namespace:
                        help="construct a gv formatted call graph from 1 or more files")
     parser.add_argument("-f", "--filter", nargs='+', type=str,
                         help="filter call graph to 1 or more function names")
+    parser.add_argument("-n", "--no-cache", dest="cache", action="store_false",
+                        help="do not read or write the cache of parsed files")
 
     args = parser.parse_args()
     return args
@@ -122,7 +246,7 @@ def parse_args() -> Namespace:
 # *****************************************************************************
 
 
-class TokenType(Enum):
+class TokenType(IntEnum):
     WORD = auto()  # [a-zA-Z_]
     KEYWORD = auto()  # Golang reserved WORD.
     NUMBER = auto()  # [0-9]
@@ -133,175 +257,144 @@ class TokenType(Enum):
     EQUAL = auto()  # =
     SYMBOL = auto()  # Catch all.
     QUOTE = auto()  # ['"`]
-    EOF = auto()  # End of file.
-
-
-@dataclass
-class Token:
-    type: TokenType
-    body: str
-    line_number: int
+    EOF = auto()  # End of file, or no token yet.
+
+
+# (type, body). Plain tuples, as a token is consumed as soon as it is made.
+Token = tuple[TokenType, str]
+
+
+# Token actions, indexed by the first byte of a token. Bytes above 0x7f can
+# only appear in identifiers outside of quotes and comments, so they are
+# treated as letters.
+_ERROR_ACTION = 0
+_WORD_ACTION = 1
+_SINGLE_ACTION = 2  # One of ( ) { } =
+_SYMBOL_ACTION = 3
+_QUOTE_ACTION = 4  # ' " or `
+_NUMBER_ACTION = 5
+_SLASH_ACTION = 6  # Comment or symbol.
+_ACTIONS = bytearray(256)
+
+# One shared Token per single byte token.
+_SINGLE_TOKENS = {
+    0x28: (TokenType.LPAREN, "("),
+    0x29: (TokenType.RPAREN, ")"),
+    0x7B: (TokenType.LBRACE, "{"),
+    0x7D: (TokenType.RBRACE, "}"),
+    0x3D: (TokenType.EQUAL, "="),
+}
+
+# Byte classes, which fill both the actions and the token pattern below.
+_WHITESPACE = b" \t\n\r\v\f"
+_DIGITS = b"0123456789"
+_LETTERS = b"abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_" + bytes(range(0x80, 0x100))
+_SYMBOLS = b"+-:?!<>*%&|^~.,[]#@$;\\"  # Incomplete. A slash has its own action.
+_QUOTES = b"'\"`"
+
+for char in _DIGITS:
+    _ACTIONS[char] = _NUMBER_ACTION
+for char in _LETTERS:
+    _ACTIONS[char] = _WORD_ACTION
+for char in _SYMBOLS:
+    _ACTIONS[char] = _SYMBOL_ACTION
+for char in _SINGLE_TOKENS:
+    _ACTIONS[char] = _SINGLE_ACTION
+for char in _QUOTES:
+    _ACTIONS[char] = _QUOTE_ACTION
+_ACTIONS[ord("/")] = _SLASH_ACTION
+
+# Splits a whole file into tokens in a single findall(), skipping the
+# whitespace in front of each token. The alternatives follow the actions
+# above, with comments split from symbols that start with a slash. Interpreted
+# strings and runes are a two state machine: a byte is either a backslash
+# escaping the next byte, or it is checked as the quote. Unterminated quotes
+# and comments run to the end of the file, and any other byte is a token of
+# its own, reported by its action.
+_TOKENS = re.compile(rb"""[%(space)s]*(
+    [%(letter)s][%(letter)s%(digit)s]*
+  | [%(single)s]
+  | [%(symbol)s]+
+  | "[^"\\]*(?:\\.[^"\\]*)*(?:"|.*)
+  | '[^'\\]*(?:\\.[^'\\]*)*(?:'|.*)
+  | `[^`]*`?
+  | [%(digit)s][%(digit)s.]*
+  | //[^\n]*\n? | /\*(?:.*?\*/|.*)
+  | /[%(symbol)s/]*
+  | [^%(space)s]
+)""" % {
+    b"space": re.escape(_WHITESPACE),
+    b"letter": re.escape(_LETTERS),
+    b"digit": re.escape(_DIGITS),
+    b"single": re.escape(bytes(_SINGLE_TOKENS)),
+    b"symbol": re.escape(_SYMBOLS),
+}, re.VERBOSE | re.DOTALL)
+
+# Keyword bytes to one shared Token per keyword. The body is interned, such
+# that it compares by identity against the literals in Parser.
+_KEYWORDS = {keyword.encode(): (TokenType.KEYWORD, intern(keyword)) for keyword in (
+    "break", "default", "func", "case", "defer", "go", "map", "struct",
+    "chan", "else", "goto", "package", "switch", "const", "fallthrough",
+    "if", "range", "type", "continue", "for", "import", "return", "var",
+)}  # Complete.
 
 
 class Tokenizer():
-    def __init__(self, file: TextIOWrapper):
-        self.__line_number = 1
+    def __init__(self, file: BufferedReader, src: Optional[bytes] = None):
         self.__file = file
 
-    def get_token(self) -> Token:
-        peak = self.__peak_next()
-
-        while peak.isspace():  # Remove whitespace.
-            self.__file.read(1)
-
-            if peak == "\n":
-                self.__line_number += 1
-            peak = self.__peak_next()
-
-        if self.__is_word(peak):
-            string = self.__read_word()
-            if self.__is_keyword(string):
-                return Token(TokenType.KEYWORD, string, self.__line_number)
-            return Token(TokenType.WORD, string, self.__line_number)
-        elif peak.isdigit():
-            string = self.__read_number()
-            return Token(TokenType.NUMBER, string, self.__line_number)
-        elif peak == '(':
-            char = self.__file.read(1)
-            return Token(TokenType.LPAREN, char, self.__line_number)
-        elif peak == ')':
-            char = self.__file.read(1)
-            return Token(TokenType.RPAREN, char, self.__line_number)
-        elif peak == "{":
-            char = self.__file.read(1)
-            return Token(TokenType.LBRACE, char, self.__line_number)
-        elif peak == "}":
-            char = self.__file.read(1)
-            return Token(TokenType.RBRACE, char, self.__line_number)
-        elif peak == "=":
-            char = self.__file.read(1)
-            return Token(TokenType.EQUAL, char, self.__line_number)
-        elif peak == "'":
-            self.__file.read(1)  # Remove first quote.
-            string, _ = self.__read_until("'")
-            return Token(TokenType.QUOTE, string, self.__line_number)
-        elif peak == '"':
-            self.__file.read(1)  # Remove first quote.
-            string, _ = self.__read_until('"')
-            return Token(TokenType.QUOTE, string, self.__line_number)
-        elif peak == '`':
-            self.__file.read(1)  # Remove first quote.
-            string, _ = self.__read_until('`')
-            return Token(TokenType.QUOTE, string, self.__line_number)
-        elif peak == "/" and self.__peak_next(2) == "//":
-            self.__read_until("\n")
-            return self.get_token()  # Return next token.
-        elif peak == "/" and self.__peak_next(2) == "/*":
-            self.__read_until("*/")
-            return self.get_token()  # Return next token.
-        elif self.__is_symbol(peak):  # Must be after comment handling!
-            string = self.__read_symbol()
-            return Token(TokenType.SYMBOL, string, self.__line_number)
-        elif peak == "":
-            return Token(TokenType.EOF, "", self.__line_number)
-
-        print(f"Error: Unexpected character {peak} on line {self.__line_number} in {self.__file}.",
-              file=stderr)
-        exit(EXIT_FAILURE)
-
-    # Returns an empty string, "", if the end of the file is reached.
-    def __peak_next(self, count: int = 1) -> str:
-        position = self.__file.tell()
-        string = self.__file.read(count)
-
-        self.__file.seek(position)
-        return string
-
-    # Returns (read, error).
-    def __read_until(self, end: str) -> tuple[str, bool]:
-        string = ""
-        while True:
-            char = self.__file.read(1)
-            if char == "":  # EOF
+        # The whole file is read up front, unless the caller already has read
+        # it; the tokenizer then walks the buffer.
+        self.__src = file.read() if src is None else src
+
+    # All of the file's tokens are matched up front by findall(), then turned
+    # into Tokens and yielded one at a time. Line numbers are not tracked, they
+    # are only worked out for errors.
+    def tokens(self) -> Iterator[Token]:
+        WORD, NUMBER = TokenType.WORD, TokenType.NUMBER
+        SYMBOL, QUOTE = TokenType.SYMBOL, TokenType.QUOTE
+
+        # Words and symbols repeat through a file, so each is decoded once and
+        # its Token shared after that. Keywords start out in the words.
+        words = dict(_KEYWORDS)
+        symbols = {}
+
+        for string in _TOKENS.findall(self.__src):
+            # Indexing bytes yields an int, which is used directly as a table index.
+            peak = string[0]
+            action = _ACTIONS[peak]
+            if action == _WORD_ACTION:
+                token = words.get(string)
+                if token is None:
+                    token = words[string] = (WORD, string.decode())
+                yield token
+            elif action == _SINGLE_ACTION:
+                yield _SINGLE_TOKENS[peak]
+            elif action == _SYMBOL_ACTION:
+                token = symbols.get(string)
+                if token is None:
+                    token = symbols[string] = (SYMBOL, string.decode())
+                yield token
+            elif action == _QUOTE_ACTION:
+                yield (QUOTE, string.decode())
+            elif action == _NUMBER_ACTION:
+                yield (NUMBER, string.decode())
+            elif action == _SLASH_ACTION:
+                if not string.startswith((b"//", b"/*")):  # Comments are skipped.
+                    yield (SYMBOL, string.decode())
+            else:
+                self.__error()
+
+    # Reports the first unexpected character in the file.
+    def __error(self) -> None:
+        for match in _TOKENS.finditer(self.__src):
+            if _ACTIONS[self.__src[match.start(1)]] == _ERROR_ACTION:
                 break
 
-            if char == "\n":
-                self.__line_number += 1
-
-            string += char
-
-            # Repeatedly calling endswith() is inefficient.
-            if string.endswith(end) and not self.__is_escaped(string, end):
-                return (string, False)
-
-        return (string, True)
-
-    def __is_escaped(self, string: str, end: str) -> bool:
-        count = 0
-
-        length = len(string) - len(end)
-        for i in range(length, 0, -1):
-            if string[i - 1] == "\\":
-                count += 1
-                continue
-            break
-
-        return (count % 2) == 1  # Escaped if an odd number of \.
-
-    def __read_word(self) -> str:
-        string = ""
-
-        char = self.__peak_next()
-        while self.__is_word(char) or char.isdigit():
-            string += self.__file.read(1)
-            char = self.__peak_next()
-
-        return string
-
-    def __read_number(self) -> str:
-        string = ""
-
-        char = self.__peak_next()
-        while char.isdigit() or char == ".":
-            string += self.__file.read(1)
-            char = self.__peak_next()
-
-        return string
-
-    def __read_symbol(self) -> str:
-        string = ""
-
-        while self.__is_symbol(self.__peak_next()):
-            string += self.__file.read(1)
-
-        return string
-
-    def __is_word(self, char: str) -> bool:
-        return char.isalpha() or char == "_"
-
-    def __is_keyword(self, string: str) -> bool:
-        if string == "break" or string == "default" or string == "func" \
-                or string == "case" or string == "defer" or string == "go" \
-                or string == "map" or string == "struct" or string == "chan" \
-                or string == "else" or string == "goto" or string == "package" \
-                or string == "switch" or string == "const" or string == "fallthrough" \
-                or string == "if" or string == "range" or string == "type" \
-                or string == "continue" or string == "for" or string == "import" \
-                or string == "return" or string == "var":  # Complete.
-            return True
-        return False
-
-    def __is_symbol(self, char: str) -> bool:
-        if char == "+" or char == "-" or char == ":" \
-                or char == "?" or char == "!" or char == "<" \
-                or char == ">" or char == "*" or char == "/" \
-                or char == "%" or char == "&" or char == "|" \
-                or char == "^" or char == "~" or char == "." \
-                or char == "," or char == "[" or char == "]" \
-                or char == "#" or char == "@" or char == "$" \
-                or char == ";" or char == "\\":  # Incomplete.
-            return True
-        return False
+        line_number = self.__src.count(b"\n", 0, match.start(1)) + 1
+        print(f"Error: Unexpected character {match.group(1).decode()} on line {line_number} in {self.__file}.",
+              file=stderr)
+        exit(EXIT_FAILURE)
 
 
 # *****************************************************************************
@@ -318,11 +411,33 @@ class Tokenizer():
 #
 
 class Parser():
-    def __init__(self, output: TextIOWrapper):
-        self.__func_called = set()
+    def __init__(self, output: list[str]):
+        self.__calls = set()  # Call lines already in the output.
         self.__output = output
 
-    def parse(self, tokenizer: Tokenizer) -> None:
+    # Adds the lines of a file to the output. Calls already added by an earlier
+    # file are not repeated.
+    def add(self, lines: list[str]) -> None:
+        for line in lines:
+            if line in self.__calls:
+                continue
+
+            if " -> " in line:
+                self.__calls.add(line)
+            self.__output.append(line)
+
+    # Returns the lines of a file, with each call listed once.
+    def parse(self, tokenizer: Tokenizer) -> list[str]:
+        # Token types as locals, which are compared on every token.
+        WORD, KEYWORD, EOF = TokenType.WORD, TokenType.KEYWORD, TokenType.EOF
+        LPAREN, RPAREN = TokenType.LPAREN, TokenType.RPAREN
+        LBRACE, RBRACE = TokenType.LBRACE, TokenType.RBRACE
+        EQUAL = TokenType.EQUAL
+
+        lines = []
+        append = lines.append
+        func_called = {}  # Caller name to the names it calls.
+
         paren_level = 0
         brace_level = 0
 
@@ -330,46 +445,55 @@ class Parser():
         in_func_decl = False
 
         func_name = None
-        prev_token = TokenType.EOF
-        while True:
-            token = tokenizer.get_token()
-            if token.type == TokenType.EOF:
-                break
-
-            if token.type == TokenType.KEYWORD and token.body == "func":
-                in_func_decl = True
-            elif token.type == TokenType.KEYWORD and token.body == "var":
-                in_var_decl = True
-            elif token.type == TokenType.WORD:
+        prev_type, prev_body = EOF, ""
+        for token_type, body in tokenizer.tokens():
+            # Token types are shared members, compared by identity. The
+            # branches are ordered by how often each type occurs.
+            if token_type is WORD:
                 if in_func_decl and paren_level == 0 and brace_level == 0 \
                         and func_name is None:
-                    func_name = token.body
-                    self.__output.write(f'\t"{func_name}";\n')
-                elif prev_token.type == TokenType.KEYWORD and prev_token.body == "go" and \
-                        f"{func_name}:{prev_token.body}" not in self.__func_called:
-                    self.__func_called.add(f"{func_name}:{prev_token.body}")
-                    self.__output.write(f'\t"{func_name if func_name else "GLOBAL"}" -> ' +
-                                        f'"{prev_token.body}";\n')
-            elif token.type == TokenType.LPAREN:
+                    func_name = body
+                    append(f'\t"{func_name}";\n')
+                elif prev_type is KEYWORD and prev_body == "go":
+                    caller = func_name if func_name else "GLOBAL"
+                    callees = func_called.get(caller)
+                    if callees is None:
+                        callees = func_called[caller] = set()
+
+                    if prev_body not in callees:
+                        callees.add(prev_body)
+                        append(f'\t"{caller}" -> "{prev_body}";\n')
+            elif token_type is LPAREN:
                 paren_level += 1
-                if not in_func_decl and not in_var_decl and prev_token.type == TokenType.WORD and \
-                        f"{func_name}:{prev_token.body}" not in self.__func_called:
-                    self.__func_called.add(f"{func_name}:{prev_token.body}")
-                    self.__output.write(f'\t"{func_name if func_name else "GLOBAL"}" -> ' +
-                                        f'"{prev_token.body}";\n')
-            elif token.type == TokenType.RPAREN:
+                if not in_func_decl and not in_var_decl and prev_type is WORD:
+                    caller = func_name if func_name else "GLOBAL"
+                    callees = func_called.get(caller)
+                    if callees is None:
+                        callees = func_called[caller] = set()
+
+                    if prev_body not in callees:
+                        callees.add(prev_body)
+                        append(f'\t"{caller}" -> "{prev_body}";\n')
+            elif token_type is RPAREN:
                 paren_level -= 1
-            elif token.type == TokenType.LBRACE:
+            elif token_type is LBRACE:
                 brace_level += 1
                 in_func_decl = False
-            elif token.type == TokenType.RBRACE:
+            elif token_type is RBRACE:
                 brace_level -= 1
                 if brace_level == 0:
                     func_name = None
-            elif token.type == TokenType.EQUAL:
+            elif token_type is KEYWORD:
+                if body == "func":
+                    in_func_decl = True
+                elif body == "var":
+                    in_var_decl = True
+            elif token_type is EQUAL:
                 in_var_decl = False
 
-            prev_token = token
+            prev_type, prev_body = token_type, body
+
+        return lines
 
 
 if __name__ == "__main__":